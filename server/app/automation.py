@@ -0,0 +1,157 @@
+"""Server-side automation rules evaluated in the ingest path.
+
+Rules are indexed by source device, so a reading is only checked against its
+own device's rules. A rule fires once per episode: when its condition has held
+for `hold_seconds`, it sets the target output and then waits for the condition
+to clear before it can fire again (so manual toggles aren't fought). Actions
+are applied in the caller's transaction, so relays pick them up on the
+device's next output poll. Episode state only changes through the RULE_STATE
+event once that transaction commits, so a rolled-back ingest leaves no trace.
+
+Holds are measured on reading timestamps, not arrival time, and readings that
+arrive too late to describe the present (a buffered backlog, a retry) are
+ignored.
+"""
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+import operator
+import os
+import threading
+import time
+
+from . import events, models
+from .state import output_to_dict
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+NUMERIC_METRICS = ("gas", "temperature", "humidity", "distance", "analog_value")
+METRICS = NUMERIC_METRICS + ("status", "digital_value")
+# Non-numeric metrics only support equality checks
+EQUALITY_OPERATORS = ("==", "!=")
+# Readings older than this (or than the rule's hold, if longer) don't drive outputs
+MAX_READING_AGE_SECONDS = float(os.getenv("AUTOMATION_MAX_READING_AGE_SECONDS", 30))
+
+
+def coerce_value(metric: str, value: str):
+    """Rule values are stored as strings; convert to the metric's type."""
+    if metric in NUMERIC_METRICS:
+        return float(value)
+    if metric == "digital_value":
+        return value.strip().lower() in ("1", "true", "on", "high")
+    return value.strip().upper()
+
+
+class CompiledRule:
+    __slots__ = ("id", "metric", "compare", "value", "hold_seconds", "output_id", "action_active")
+
+    def __init__(self, rule: models.AutomationRule):
+        self.id = rule.id
+        self.metric = rule.metric
+        self.compare = OPERATORS[rule.operator]
+        self.value = coerce_value(rule.metric, rule.value)
+        self.hold_seconds = rule.hold_seconds or 0
+        self.output_id = rule.output_id
+        self.action_active = rule.action_active
+
+    def matches(self, reading: dict) -> Optional[bool]:
+        """None if the reading doesn't carry this rule's metric."""
+        observed = reading.get(self.metric)
+        if observed is None:
+            return None
+        if self.metric == "status":
+            observed = str(observed).upper()
+        return self.compare(observed, self.value)
+
+
+class AutomationEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rules: Dict[str, List[CompiledRule]] = {}
+        # rule id -> (condition_since, fired_this_episode)
+        self.state: Dict[int, Tuple[Optional[float], bool]] = {}
+        # Bumped on every rules event so loads racing with a change are discarded
+        self._versions: Dict[str, int] = {}
+        self._epoch = 0
+
+    def rules_for(self, db: Session, device_id: str) -> List[CompiledRule]:
+        rules = self.rules.get(device_id)
+        if rules is None:
+            version = (self._epoch, self._versions.get(device_id, 0))
+            rows = db.query(models.AutomationRule).filter(
+                models.AutomationRule.device_id == device_id,
+                models.AutomationRule.enabled == True,  # noqa: E712
+            ).all()
+            rules = [CompiledRule(row) for row in rows]
+            with self._lock:
+                # A rule change committed while we were querying may be missing
+                # from `rows`; use them this once but let the next reading reload
+                if version == (self._epoch, self._versions.get(device_id, 0)):
+                    self.rules[device_id] = rules
+        return rules
+
+    def evaluate(self, db: Session, device_id: str, reading: dict, now: Optional[float] = None) -> List[int]:
+        """Check a new reading against its device's rules. Returns ids of rules that fired."""
+        rules = self.rules_for(db, device_id)
+        if not rules:
+            return []
+        now = time.time() if now is None else now
+        taken_at = reading["timestamp"].replace(tzinfo=timezone.utc).timestamp()
+        fired = []
+        for rule in rules:
+            if now - taken_at > max(rule.hold_seconds, MAX_READING_AGE_SECONDS):
+                continue
+            matched = rule.matches(reading)
+            if matched is None:
+                continue
+            state = self.state.get(rule.id, (None, False))
+            since, done = state
+            if since is not None and taken_at < since:
+                # Out of order: older than the episode it would extend or end
+                continue
+            if not matched:
+                new_state = (None, False)
+            else:
+                since = taken_at if since is None else since
+                if not done and taken_at - since >= rule.hold_seconds:
+                    apply_action(db, rule)
+                    fired.append(rule.id)
+                    done = True
+                new_state = (since, done)
+            if new_state != state:
+                # Applied by handle_event after commit, on this worker and the others
+                events.publish(db, events.RULE_STATE, device_id=device_id, rule_id=rule.id, since=new_state[0], fired=new_state[1])
+        return fired
+
+    def handle_event(self, message: dict):
+        kind = message.get("event")
+        with self._lock:
+            if kind == events.RULE_STATE:
+                self.state[message["rule_id"]] = (message["since"], message["fired"])
+            elif kind in (events.RULES_CHANGED, events.DEVICE_DELETED):
+                device_id = message["device_id"]
+                self._versions[device_id] = self._versions.get(device_id, 0) + 1
+                for rule in self.rules.pop(device_id, []):
+                    self.state.pop(rule.id, None)
+            elif kind == events.RESYNC:
+                self._epoch += 1
+                self.rules.clear()
+
+
+def apply_action(db: Session, rule: CompiledRule):
+    output = db.query(models.DeviceOutput).filter(models.DeviceOutput.id == rule.output_id).first()
+    if output is None or output.is_active == rule.action_active:
+        return
+    output.is_active = rule.action_active
+    output.last_updated = datetime.utcnow()
+    events.publish(db, events.OUTPUT_CHANGED, device_id=output.device_id, output=output_to_dict(output))
+
+
+engine = AutomationEngine()
+events.subscribe(engine.handle_event)
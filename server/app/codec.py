@@ -0,0 +1,271 @@
+"""Columnar encoding for cold reading blocks.
+
+Timestamps are delta-of-delta encoded (microseconds), integers delta encoded,
+and floats XOR-encoded against the previous value as in Facebook's Gorilla
+paper, so slowly changing sensor values cost a few bits each. Nulls are kept in
+a per-column bitmap. The whole block is then zlib-compressed.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+import struct
+import zlib
+
+FORMAT_VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+
+# Column kinds
+TIME = "time"
+INT = "int"
+FLOAT = "float"
+BOOL = "bool"
+STR = "str"
+
+
+# --- bit and varint primitives ---
+
+class BitWriter:
+    def __init__(self):
+        self.buf = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value: int, nbits: int):
+        self._acc = (self._acc << nbits) | value
+        self._bits += nbits
+        while self._bits >= 8:
+            self._bits -= 8
+            self.buf.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1
+
+    def getvalue(self) -> bytes:
+        if self._bits:
+            return bytes(self.buf) + bytes([(self._acc << (8 - self._bits)) & 0xFF])
+        return bytes(self.buf)
+
+
+class BitReader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+        self._acc = 0
+        self._bits = 0
+
+    def read(self, nbits: int) -> int:
+        while self._bits < nbits:
+            self._acc = (self._acc << 8) | self.data[self.pos]
+            self.pos += 1
+            self._bits += 8
+        self._bits -= nbits
+        value = self._acc >> self._bits
+        self._acc &= (1 << self._bits) - 1
+        return value
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) if n >= 0 else ((-n << 1) - 1)
+
+
+def _unzigzag(n: int) -> int:
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+
+
+def _write_varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+# --- column encoders (values never contain None here) ---
+
+def _encode_deltas(values: Sequence[int], order: int) -> bytes:
+    out = bytearray()
+    prev = prev_delta = 0
+    for value in values:
+        delta = value - prev
+        _write_varint(out, _zigzag(delta - prev_delta if order == 2 else delta))
+        prev, prev_delta = value, delta
+    return bytes(out)
+
+
+def _decode_deltas(data: bytes, count: int, order: int) -> List[int]:
+    values = []
+    pos = prev = prev_delta = 0
+    for _ in range(count):
+        raw, pos = _read_varint(data, pos)
+        delta = _unzigzag(raw) + (prev_delta if order == 2 else 0)
+        prev += delta
+        prev_delta = delta
+        values.append(prev)
+    return values
+
+
+def _encode_floats(values: Sequence[float]) -> bytes:
+    writer = BitWriter()
+    prev = None
+    prev_lead = prev_trail = -1
+    for value in values:
+        bits = struct.unpack(">Q", struct.pack(">d", value))[0]
+        if prev is None:
+            writer.write(bits, 64)
+            prev = bits
+            continue
+        xor = bits ^ prev
+        prev = bits
+        if xor == 0:
+            writer.write(0, 1)
+            continue
+        lead = min(64 - xor.bit_length(), 31)
+        trail = (xor & -xor).bit_length() - 1
+        if prev_lead >= 0 and lead >= prev_lead and trail >= prev_trail:
+            # Fits in the previous meaningful window
+            writer.write(0b10, 2)
+            writer.write(xor >> prev_trail, 64 - prev_lead - prev_trail)
+        else:
+            length = 64 - lead - trail
+            writer.write(0b11, 2)
+            writer.write(lead, 5)
+            writer.write(length & 0x3F, 6)  # 64 is stored as 0
+            writer.write(xor >> trail, length)
+            prev_lead, prev_trail = lead, trail
+    return writer.getvalue()
+
+
+def _decode_floats(data: bytes, count: int) -> List[float]:
+    if not count:
+        return []
+    reader = BitReader(data)
+    unpack, pack = struct.unpack, struct.pack
+    prev = reader.read(64)
+    values = [unpack(">d", pack(">Q", prev))[0]]
+    lead = trail = 0
+    for _ in range(count - 1):
+        if reader.read(1):
+            if reader.read(1):
+                lead = reader.read(5)
+                length = reader.read(6) or 64
+                trail = 64 - lead - length
+            prev ^= reader.read(64 - lead - trail) << trail
+        values.append(unpack(">d", pack(">Q", prev))[0])
+    return values
+
+
+def _encode_bitmap(flags: Sequence[bool]) -> bytes:
+    writer = BitWriter()
+    for flag in flags:
+        writer.write(1 if flag else 0, 1)
+    return writer.getvalue()
+
+
+def _decode_bitmap(data: bytes, count: int) -> List[bool]:
+    reader = BitReader(data)
+    return [bool(reader.read(1)) for _ in range(count)]
+
+
+def _to_micros(value: datetime) -> int:
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _encode_column(kind: str, values: Sequence) -> bytes:
+    if kind == TIME:
+        return _encode_deltas([_to_micros(v) for v in values], order=2)
+    if kind == INT:
+        return _encode_deltas(values, order=1)
+    if kind == FLOAT:
+        return _encode_floats(values)
+    if kind == BOOL:
+        return _encode_bitmap(values)
+    if kind == STR:
+        dictionary = sorted(set(values))
+        codes = {value: index for index, value in enumerate(dictionary)}
+        out = bytearray()
+        _write_varint(out, len(dictionary))
+        for value in dictionary:
+            raw = value.encode("utf-8")
+            _write_varint(out, len(raw))
+            out += raw
+        for value in values:
+            _write_varint(out, codes[value])
+        return bytes(out)
+    raise ValueError(f"Unknown column kind: {kind}")
+
+
+def _decode_column(kind: str, data: bytes, count: int) -> list:
+    if kind == TIME:
+        return [EPOCH + timedelta(microseconds=v) for v in _decode_deltas(data, count, order=2)]
+    if kind == INT:
+        return _decode_deltas(data, count, order=1)
+    if kind == FLOAT:
+        return _decode_floats(data, count)
+    if kind == BOOL:
+        return _decode_bitmap(data, count)
+    if kind == STR:
+        size, pos = _read_varint(data, 0)
+        dictionary = []
+        for _ in range(size):
+            length, pos = _read_varint(data, pos)
+            dictionary.append(data[pos:pos + length].decode("utf-8"))
+            pos += length
+        values = []
+        for _ in range(count):
+            code, pos = _read_varint(data, pos)
+            values.append(dictionary[code])
+        return values
+    raise ValueError(f"Unknown column kind: {kind}")
+
+
+# --- blocks ---
+
+def encode_block(schema: Sequence[Tuple[str, str]], columns: Dict[str, list]) -> bytes:
+    """Encode equally long `columns` (name -> values, None allowed) per `schema`."""
+    count = len(columns[schema[0][0]])
+    out = bytearray([FORMAT_VERSION])
+    _write_varint(out, count)
+    for name, kind in schema:
+        values = columns[name]
+        present = [value is not None for value in values]
+        has_nulls = not all(present)
+        out.append(1 if has_nulls else 0)
+        if has_nulls:
+            out += _encode_bitmap(present)
+            values = [value for value in values if value is not None]
+        payload = _encode_column(kind, values)
+        _write_varint(out, len(payload))
+        out += payload
+    return zlib.compress(bytes(out), 6)
+
+
+def decode_block(schema: Sequence[Tuple[str, str]], blob: bytes) -> Dict[str, list]:
+    data = zlib.decompress(blob)
+    if data[0] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported block format {data[0]}")
+    count, pos = _read_varint(data, 1)
+    columns = {}
+    for name, kind in schema:
+        has_nulls = data[pos]
+        pos += 1
+        present: Optional[List[bool]] = None
+        if has_nulls:
+            size = (count + 7) // 8
+            present = _decode_bitmap(data[pos:pos + size], count)
+            pos += size
+        length, pos = _read_varint(data, pos)
+        segment = data[pos:pos + length]
+        pos += length
+        if present is None:
+            columns[name] = _decode_column(kind, segment, count)
+        else:
+            stored = iter(_decode_column(kind, segment, sum(present)))
+            columns[name] = [next(stored) if flag else None for flag in present]
+    return columns
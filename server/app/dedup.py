@@ -0,0 +1,157 @@
+"""Duplicate suppression for device retries.
+
+Devices may send a per-device monotonic `seq` and/or their own `timestamp`.
+A bounded in-memory window of recently accepted keys catches blind retries
+before the insert; unique (device_id, seq) and (device_id, timestamp)
+constraints are the durable backstop across workers and restarts. `seq` must
+keep increasing across reboots (persist it in NVS or derive it from epoch
+time), otherwise a reset counter collides with rows already stored. Retries
+must resend the original timestamp.
+
+Partitioned tables can only carry the timestamp backstop, so there a `seq`
+without a device timestamp is rejected.
+"""
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Optional
+import os
+import threading
+
+from . import database, events, partitioning
+
+WINDOW_SIZE = int(os.getenv("DEDUP_WINDOW_SIZE", 64))
+MAX_DEVICES = int(os.getenv("DEDUP_MAX_DEVICES", 50_000))
+# Device clocks outside [now - MAX_AGE, now + MAX_SKEW] are treated as broken
+MAX_CLOCK_SKEW = timedelta(seconds=float(os.getenv("DEVICE_CLOCK_MAX_SKEW_SECONDS", 300)))
+MAX_TIMESTAMP_AGE = timedelta(days=float(os.getenv("DEVICE_TIMESTAMP_MAX_AGE_DAYS", 30)))
+SERVER_TIMESTAMP_ATTEMPTS = 3
+
+
+class DedupWindow:
+    """Remembers the last `size` accepted keys per device (LRU over devices)."""
+
+    def __init__(self, size: int = WINDOW_SIZE, max_devices: int = MAX_DEVICES):
+        self.size = size
+        self.max_devices = max_devices
+        self._devices: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, device_id: str, key) -> bool:
+        with self._lock:
+            entry = self._devices.get(device_id)
+            return entry is not None and key in entry[1]
+
+    def add(self, device_id: str, key):
+        with self._lock:
+            entry = self._devices.get(device_id)
+            if entry is None:
+                entry = self._devices[device_id] = (deque(), set())
+                while len(self._devices) > self.max_devices:
+                    self._devices.popitem(last=False)
+            else:
+                self._devices.move_to_end(device_id)
+            order, keys = entry
+            if key in keys:
+                return
+            order.append(key)
+            keys.add(key)
+            if len(order) > self.size:
+                keys.discard(order.popleft())
+
+    def forget(self, device_id: str):
+        with self._lock:
+            self._devices.pop(device_id, None)
+
+
+def dedup_key(seq: Optional[int], timestamp: Optional[datetime]):
+    """Key identifying a reading across retries, or None if the device sent neither."""
+    if seq is not None:
+        return ("seq", seq)
+    if timestamp is not None:
+        return ("ts", timestamp)
+    return None
+
+
+def normalize_timestamp(value: Optional[datetime]) -> Optional[datetime]:
+    """Device timestamps are stored as naive UTC like server-generated ones."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def device_timestamp(seq: Optional[int], value: Optional[datetime], now: Optional[datetime] = None) -> Optional[datetime]:
+    """Normalized device timestamp for an incoming reading, or 400 if unusable.
+
+    A clock stuck in 1970 or running ahead would pin rows to the top of
+    "latest N" lists, and a far-future row in a DEFAULT partition blocks
+    creating that partition later.
+    """
+    timestamp = normalize_timestamp(value)
+    if timestamp is None:
+        if seq is not None and partitioning.is_enabled(database.engine):
+            raise HTTPException(status_code=400, detail="Readings with seq must include the device timestamp")
+        return None
+    now = now or datetime.utcnow()
+    if not now - MAX_TIMESTAMP_AGE <= timestamp <= now + MAX_CLOCK_SKEW:
+        raise HTTPException(status_code=400, detail="Device timestamp out of range; check the device clock")
+    return timestamp
+
+
+def find_existing(db: Session, model, device_id: str, seq: Optional[int], timestamp: Optional[datetime]):
+    """The previously stored row a duplicate refers to, if any.
+
+    With a `seq`, only that seq identifies a duplicate: a row sharing the
+    timestamp but carrying another seq is a different reading, reported as 409.
+    """
+    query = db.query(model).filter(model.device_id == device_id)
+    if seq is not None:
+        existing = query.filter(model.seq == seq).order_by(model.id.desc()).first()
+        if existing is not None:
+            return existing
+    if timestamp is None:
+        return None
+    existing = query.filter(model.timestamp == timestamp).order_by(model.id.desc()).first()
+    if existing is not None and seq is not None and existing.seq is not None:
+        raise HTTPException(status_code=409, detail="Another reading already has this device timestamp")
+    return existing
+
+
+def insert_reading(db: Session, model, device_id: str, seq: Optional[int], timestamp: Optional[datetime], **values):
+    """Insert a reading, or find the stored row it duplicates. Returns (row, created).
+
+    Server-stamped readings (no device timestamp) can only hit the
+    (device_id, timestamp) backstop by coincidence, so they are retried with a
+    fresh timestamp instead of failing.
+    """
+    for attempt in range(SERVER_TIMESTAMP_ATTEMPTS):
+        # Late readings keep the time they were taken on the device
+        row = model(device_id=device_id, seq=seq, timestamp=timestamp or datetime.utcnow() + timedelta(microseconds=attempt), **values)
+        db.add(row)
+        try:
+            db.flush()
+            return row, True
+        except IntegrityError:
+            # Another worker (or a restart) already stored this reading
+            db.rollback()
+            existing = find_existing(db, model, device_id, seq, timestamp)
+            if existing is not None:
+                return existing, False
+            if timestamp is not None or attempt == SERVER_TIMESTAMP_ATTEMPTS - 1:
+                raise
+
+
+# Separate windows: a combined device may run independent counters per table
+sensor_data_window = DedupWindow()
+ldr_window = DedupWindow()
+
+
+def handle_event(message: dict):
+    if message.get("event") == events.DEVICE_DELETED:
+        sensor_data_window.forget(message["device_id"])
+        ldr_window.forget(message["device_id"])
+
+
+events.subscribe(handle_event)
@@ -0,0 +1,137 @@
+"""Change notifications shared between uvicorn workers.
+
+On Postgres, events are sent with pg_notify inside the writer's transaction, so
+every worker (including the sender) receives them via LISTEN only once the
+write has committed. On SQLite there is a single process, so events are
+dispatched in-process after commit.
+"""
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+import json
+import select
+import threading
+import time
+
+from .serialization import dumps
+
+CHANNEL = "sensegrid_events"
+
+DEVICE_CREATED = "device_created"
+DEVICE_DELETED = "device_deleted"
+OUTPUT_CHANGED = "output_changed"
+RULES_CHANGED = "rules_changed"
+RULE_STATE = "rule_state"
+# Sent locally when the LISTEN connection was lost and events may have been missed
+RESYNC = "resync"
+
+_handlers = []
+_listener = None
+
+
+def subscribe(handler):
+    """Register `handler(message: dict)` for every event. Returns the handler."""
+    _handlers.append(handler)
+    return handler
+
+
+def unsubscribe(handler):
+    if handler in _handlers:
+        _handlers.remove(handler)
+
+
+def _dispatch(message: dict):
+    for handler in list(_handlers):
+        try:
+            handler(message)
+        except Exception as e:
+            print(f"Event handler failed for {message.get('event')}: {e}")
+
+
+def publish(db: Session, event_type: str, **payload):
+    """Queue an event that is delivered to all workers once `db` commits."""
+    message = {"event": event_type, "sent_at": time.time(), **payload}
+    body = dumps(message).decode("utf-8")
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": body})
+    else:
+        db.info.setdefault("pending_events", []).append(body)
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_local_events(session):
+    for body in session.info.pop("pending_events", []):
+        _dispatch(json.loads(body))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_local_events(session):
+    session.info.pop("pending_events", None)
+
+
+class PostgresListener(threading.Thread):
+    """Background thread holding a dedicated LISTEN connection."""
+
+    def __init__(self, engine, poll_timeout: float = 5.0, retry_delay: float = 2.0):
+        super().__init__(name="event-listener", daemon=True)
+        self.engine = engine
+        self.poll_timeout = poll_timeout
+        self.retry_delay = retry_delay
+        self.ready = threading.Event()
+        self._stopped = threading.Event()
+
+    def _connect(self):
+        raw = self.engine.raw_connection()
+        raw.detach()  # Never hand the LISTEN connection back to the pool
+        connection = getattr(raw, "driver_connection", None) or raw.connection
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return connection
+
+    def run(self):
+        first = True
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = self._connect()
+                if not first:
+                    # Anything sent while we were disconnected is lost
+                    _dispatch({"event": RESYNC, "sent_at": time.time()})
+                first = False
+                self.ready.set()
+                while not self._stopped.is_set():
+                    if select.select([connection], [], [], self.poll_timeout) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        _dispatch(json.loads(notify.payload))
+            except Exception as e:
+                print(f"Event listener connection lost: {e}")
+                self._stopped.wait(self.retry_delay)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start(engine):
+    """Start listening for events from other workers (no-op off Postgres)."""
+    global _listener
+    if engine.dialect.name != "postgresql" or _listener is not None:
+        return _listener
+    _listener = PostgresListener(engine)
+    _listener.start()
+    return _listener
+
+
+def stop():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
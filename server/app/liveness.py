@@ -0,0 +1,189 @@
+"""Device last-seen tracking and offline detection.
+
+Every device request calls `tracker.touch(device_id)`. Offline transitions are
+found with a hashed timing wheel: each device sits in the slot of its deadline
+and is moved in O(1) when it checks in, so a tick only looks at devices whose
+deadline actually falls in that slot instead of scanning the whole fleet.
+Last-seen times are written to `devices.last_seen` in periodic batches so other
+workers (and restarts) see them.
+"""
+from datetime import datetime
+from sqlalchemy import bindparam, or_, update
+from typing import Callable, Dict, List, Optional, Set
+import math
+import os
+import threading
+import time
+
+from . import events, models
+
+OFFLINE_AFTER_SECONDS = float(os.getenv("DEVICE_OFFLINE_AFTER_SECONDS", 30))
+TICK_SECONDS = float(os.getenv("LIVENESS_TICK_SECONDS", 1))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("LIVENESS_FLUSH_SECONDS", 15))
+
+
+class TimingWheel:
+    """Hashed timing wheel mapping each key to a single pending deadline."""
+
+    def __init__(self, tick: float, span: float, now: float):
+        self.tick = tick
+        # One extra slot so a full-span deadline never lands on the current slot
+        self.size = int(math.ceil(span / tick)) + 1
+        self.slots: List[Set[str]] = [set() for _ in range(self.size)]
+        self.deadlines: Dict[str, int] = {}
+        self.current = int(now // tick)
+
+    def schedule(self, key: str, deadline: float):
+        tick = max(int(math.ceil(deadline / self.tick)), self.current + 1)
+        old = self.deadlines.get(key)
+        if old is not None:
+            self.slots[old % self.size].discard(key)
+        self.deadlines[key] = tick
+        self.slots[tick % self.size].add(key)
+
+    def cancel(self, key: str):
+        old = self.deadlines.pop(key, None)
+        if old is not None:
+            self.slots[old % self.size].discard(key)
+
+    def advance(self, now: float) -> List[str]:
+        """Move the wheel up to `now` and return every key whose deadline passed."""
+        expired = []
+        target = int(now // self.tick)
+        # After a long stall, one full turn already visits every slot
+        start = max(self.current + 1, target - self.size + 1)
+        for tick in range(start, target + 1):
+            slot = self.slots[tick % self.size]
+            due = [key for key in slot if self.deadlines[key] <= target]
+            for key in due:
+                slot.discard(key)
+                del self.deadlines[key]
+            expired.extend(due)
+        self.current = max(self.current, target)
+        return expired
+
+
+class LivenessTracker:
+    def __init__(self, offline_after: float = OFFLINE_AFTER_SECONDS, tick: float = TICK_SECONDS):
+        self.offline_after = offline_after
+        self._lock = threading.Lock()
+        self.last_seen: Dict[str, float] = {}
+        self.online: Set[str] = set()
+        self._dirty: Dict[str, float] = {}
+        self._wheel = TimingWheel(tick, offline_after, time.time())
+        # Called with (device_id, is_online) on every transition
+        self.listeners: List[Callable[[str, bool], None]] = []
+
+    def touch(self, device_id: str, seen_at: Optional[float] = None):
+        seen_at = time.time() if seen_at is None else seen_at
+        with self._lock:
+            if seen_at <= self.last_seen.get(device_id, 0):
+                return
+            self.last_seen[device_id] = seen_at
+            self._dirty[device_id] = seen_at
+            came_online = device_id not in self.online
+            self.online.add(device_id)
+            self._wheel.schedule(device_id, seen_at + self.offline_after)
+        if came_online:
+            self._notify(device_id, True)
+
+    def forget(self, device_id: str):
+        with self._lock:
+            self.last_seen.pop(device_id, None)
+            self._dirty.pop(device_id, None)
+            self.online.discard(device_id)
+            self._wheel.cancel(device_id)
+
+    def tick(self, now: Optional[float] = None) -> List[str]:
+        """Expire devices whose deadline has passed. Returns the ones that went offline."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = self._wheel.advance(now)
+            self.online.difference_update(expired)
+        for device_id in expired:
+            self._notify(device_id, False)
+        return expired
+
+    def _notify(self, device_id: str, is_online: bool):
+        for listener in list(self.listeners):
+            try:
+                listener(device_id, is_online)
+            except Exception as e:
+                print(f"Liveness listener failed for {device_id}: {e}")
+
+    def status(self, device_id: str, stored_last_seen: Optional[datetime] = None):
+        """(online, last_seen) combining this worker's view with the persisted value."""
+        local = self.last_seen.get(device_id)
+        last_seen = stored_last_seen
+        if local is not None:
+            local_dt = datetime.utcfromtimestamp(local)
+            if last_seen is None or local_dt > last_seen:
+                last_seen = local_dt
+        if device_id in self.online:
+            return True, last_seen
+        online = last_seen is not None and (datetime.utcnow() - last_seen).total_seconds() < self.offline_after
+        return online, last_seen
+
+    def flush(self, session_factory):
+        """Persist pending last-seen times in one batched UPDATE."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        params = [{"b_device_id": device_id, "b_last_seen": datetime.utcfromtimestamp(seen)} for device_id, seen in dirty.items()]
+        statement = (
+            update(models.Device.__table__)
+            .where(models.Device.device_id == bindparam("b_device_id"))
+            # Never move last_seen backwards if another worker wrote a newer value
+            .where(or_(models.Device.last_seen.is_(None), models.Device.last_seen < bindparam("b_last_seen")))
+            .values(last_seen=bindparam("b_last_seen"))
+        )
+        db = session_factory()
+        try:
+            db.execute(statement, params)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Retry these on the next flush unless newer values arrived meanwhile
+            with self._lock:
+                for device_id, seen in dirty.items():
+                    self._dirty.setdefault(device_id, seen)
+            raise
+        finally:
+            db.close()
+        return len(params)
+
+    def handle_event(self, message: dict):
+        kind = message.get("event")
+        # Readings on other workers reach us through the batched last_seen flush
+        if kind == events.DEVICE_DELETED:
+            self.forget(message["device_id"])
+
+
+tracker = LivenessTracker()
+events.subscribe(tracker.handle_event)
+
+_thread = None
+
+
+def start(session_factory):
+    """Run the wheel ticks and periodic last-seen flushes in a daemon thread."""
+    global _thread
+    if _thread is not None:
+        return _thread
+
+    def loop():
+        next_flush = time.time() + FLUSH_INTERVAL_SECONDS
+        while True:
+            time.sleep(TICK_SECONDS)
+            tracker.tick()
+            if time.time() >= next_flush:
+                next_flush = time.time() + FLUSH_INTERVAL_SECONDS
+                try:
+                    tracker.flush(session_factory)
+                except Exception as e:
+                    print(f"Failed to persist device last_seen: {e}")
+
+    _thread = threading.Thread(target=loop, name="liveness", daemon=True)
+    _thread.start()
+    return _thread
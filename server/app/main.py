@@ -1,9 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
-from .routers import auth, devices, data, users, ldr
+from .database import engine, Base, SessionLocal
+from . import events, liveness, partitioning
+from .routers import auth, devices, data, users, ldr, automation
 
-# Create database tables
+# Create database tables (partitioned reading tables first, when enabled)
+partitioning.setup(engine)
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="TRONIX365 Indianiiot")
@@ -32,6 +34,19 @@ app.include_router(users.router)
 app.include_router(devices.router)
 app.include_router(data.router)
 app.include_router(ldr.router)
+app.include_router(automation.router)
+
+@app.on_event("startup")
+def start_background_jobs():
+    partitioning.start_maintenance_thread(engine)
+    events.start(engine)
+    liveness.start(SessionLocal)
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    events.stop()
+    # Don't lose the last batch of last_seen updates
+    liveness.tracker.flush(SessionLocal)
 
 @app.get("/")
 def read_root():
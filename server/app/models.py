@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Boolean, JSON, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -23,6 +23,7 @@ class Device(Base):
     device_token = Column(String) # For ESP32 authentication
     device_type = Column(String, default="gas_sensor") # gas_sensor, ldr_sensor
     created_at = Column(DateTime, default=datetime.utcnow)
+    last_seen = Column(DateTime, nullable=True) # Batched from the liveness tracker
 
     owner = relationship("User", back_populates="devices")
     readings = relationship("SensorData", back_populates="device")
@@ -31,10 +32,16 @@ class Device(Base):
 
 class SensorData(Base):
     __tablename__ = "sensor_data"
+    # Durable backstops for retried ingests, by seq or by device timestamp (NULL seq never conflicts)
+    __table_args__ = (
+        UniqueConstraint("device_id", "seq", name="uq_sensor_data_device_seq"),
+        UniqueConstraint("device_id", "timestamp", name="uq_sensor_data_device_ts"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(String, ForeignKey("devices.device_id"))
     timestamp = Column(DateTime, default=datetime.utcnow)
+    seq = Column(BigInteger, nullable=True) # Optional device-side sequence number
     
     gas = Column(Float, nullable=True)
     temperature = Column(Float, nullable=True)
@@ -50,10 +57,15 @@ class SensorData(Base):
 
 class LDRReading(Base):
     __tablename__ = "ldr_readings"
+    __table_args__ = (
+        UniqueConstraint("device_id", "seq", name="uq_ldr_readings_device_seq"),
+        UniqueConstraint("device_id", "timestamp", name="uq_ldr_readings_device_ts"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(String, ForeignKey("devices.device_id"))
     timestamp = Column(DateTime, default=datetime.utcnow)
+    seq = Column(BigInteger, nullable=True) # Optional device-side sequence number
     
     digital_value = Column(Boolean) # 0 or 1
     analog_value = Column(Integer) # 0 to 1050
@@ -73,3 +85,39 @@ class DeviceOutput(Base):
 
     device = relationship("Device", back_populates="outputs")
 
+
+class AutomationRule(Base):
+    __tablename__ = "automation_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(String, ForeignKey("devices.device_id"), index=True) # Source of readings
+
+    # Condition: e.g. analog_value < 300 held for 10s, or status == DANGER
+    metric = Column(String)
+    operator = Column(String)
+    value = Column(String)
+    hold_seconds = Column(Integer, default=0)
+
+    # Action
+    output_id = Column(Integer, ForeignKey("device_outputs.id"))
+    action_active = Column(Boolean, default=True)
+    enabled = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    device = relationship("Device")
+    output = relationship("DeviceOutput")
+
+# Compressed hour of historical readings for one device (see coldstorage.py)
+class ReadingBlock(Base):
+    __tablename__ = "reading_blocks"
+    __table_args__ = (UniqueConstraint("kind", "device_id", "start", name="uq_reading_blocks_kind_device_start"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String) # sensor_data, ldr_readings
+    device_id = Column(String, ForeignKey("devices.device_id"), index=True)
+    start = Column(DateTime) # Start of the hour covered
+
+    first_timestamp = Column(DateTime)
+    last_timestamp = Column(DateTime)
+    row_count = Column(Integer)
+    payload = Column(LargeBinary)
@@ -0,0 +1,241 @@
+"""Optional time-range partitioning for the reading tables (Postgres only).
+
+Enable with READINGS_PARTITION_INTERVAL=daily|monthly. The parent tables keep
+the same names and columns as models.SensorData / models.LDRReading, so ORM
+queries work unchanged. SQLite and unpartitioned Postgres are left alone.
+
+Postgres requires unique constraints on a partitioned table to include the
+partition key, so only the (device_id, timestamp) backstop exists here and
+devices sending `seq` must also send their own timestamp (see app.dedup).
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import inspect, text
+from .database import Base
+from . import coldstorage, models  # noqa: F401 - models registers tables on Base.metadata
+import os
+import re
+import threading
+import time
+
+PARTITION_INTERVAL = os.getenv("READINGS_PARTITION_INTERVAL", "").lower() or None  # daily, monthly
+PARTITIONS_AHEAD = int(os.getenv("READINGS_PARTITIONS_AHEAD", 3))
+# 0 disables retention; otherwise whole partitions older than this are dropped
+RETENTION_DAYS = int(os.getenv("READINGS_RETENTION_DAYS", 0))
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("READINGS_PARTITION_MAINTENANCE_SECONDS", 3600))
+
+PARTITIONED_TABLES = {
+    "sensor_data": """
+        CREATE TABLE IF NOT EXISTS sensor_data (
+            id SERIAL,
+            device_id VARCHAR REFERENCES devices (device_id),
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            seq BIGINT,
+            gas DOUBLE PRECISION,
+            temperature DOUBLE PRECISION,
+            humidity DOUBLE PRECISION,
+            distance DOUBLE PRECISION,
+            status VARCHAR,
+            PRIMARY KEY (id, timestamp),
+            CONSTRAINT uq_sensor_data_device_ts UNIQUE (device_id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """,
+    "ldr_readings": """
+        CREATE TABLE IF NOT EXISTS ldr_readings (
+            id SERIAL,
+            device_id VARCHAR REFERENCES devices (device_id),
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            seq BIGINT,
+            digital_value BOOLEAN,
+            analog_value INTEGER,
+            PRIMARY KEY (id, timestamp),
+            CONSTRAINT uq_ldr_readings_device_ts UNIQUE (device_id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """,
+}
+
+_PARTITION_NAME = re.compile(r"^(?P<table>\w+)_p(?P<start>\d{6}|\d{8})$")
+
+
+def is_enabled(engine) -> bool:
+    return PARTITION_INTERVAL in ("daily", "monthly") and engine.dialect.name == "postgresql"
+
+
+def _period_start(day: date, interval: str) -> date:
+    return day if interval == "daily" else day.replace(day=1)
+
+
+def _next_period(start: date, interval: str) -> date:
+    if interval == "daily":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(table: str, start: date, interval: str) -> str:
+    suffix = start.strftime("%Y%m%d") if interval == "daily" else start.strftime("%Y%m")
+    return f"{table}_p{suffix}"
+
+
+def _parse_partition_name(name: str):
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    raw = match.group("start")
+    interval, fmt = ("daily", "%Y%m%d") if len(raw) == 8 else ("monthly", "%Y%m")
+    return match.group("table"), datetime.strptime(raw, fmt).date(), interval
+
+
+def is_partitioned(connection, table: str) -> bool:
+    return connection.execute(
+        text("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :t"),
+        {"t": table},
+    ).first() is not None
+
+
+def create_partitioned_tables(connection):
+    """Create the partitioned parents (plus a default partition) if missing."""
+    existing = inspect(connection).get_table_names()
+    for table, ddl in PARTITIONED_TABLES.items():
+        if table in existing:
+            if not is_partitioned(connection, table):
+                print(f"Table '{table}' exists as a plain table; run partition_tables.py to convert it.")
+            continue
+        connection.execute(text(ddl))
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_device_ts ON {table} (device_id, timestamp DESC)"))
+        # Catches rows outside every pre-created range (e.g. late device timestamps)
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+        print(f"Created partitioned table '{table}'.")
+
+
+def _create_partition(connection, table: str, start: date, interval: str):
+    end = _next_period(start, interval)
+    name = partition_name(table, start, interval)
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    return name
+
+
+def create_partitions(connection, table: str, first: date, last: date, interval: str):
+    """Create every missing partition of `table` covering [first, last]."""
+    start = _period_start(first, interval)
+    while start <= last:
+        _create_partition(connection, table, start, interval)
+        start = _next_period(start, interval)
+
+
+def ensure_future_partitions(engine, interval: str = None, ahead: int = None):
+    """Create upcoming partitions, each in its own transaction.
+
+    One failing period (e.g. rows for it already sit in the default partition)
+    is logged and doesn't block the others or retention.
+    """
+    interval = interval or PARTITION_INTERVAL
+    ahead = PARTITIONS_AHEAD if ahead is None else ahead
+    today = _period_start(datetime.utcnow().date(), interval)
+    periods = [today]
+    for _ in range(ahead):
+        periods.append(_next_period(periods[-1], interval))
+    with engine.connect() as connection:
+        tables = [table for table in PARTITIONED_TABLES if is_partitioned(connection, table)]
+    failed = []
+    for table in tables:
+        for start in periods:
+            try:
+                with engine.begin() as connection:
+                    _create_partition(connection, table, start, interval)
+            except Exception as e:
+                name = partition_name(table, start, interval)
+                print(f"Could not create partition {name}: {e}")
+                failed.append(name)
+    return failed
+
+
+def drop_expired_partitions(engine, retention_days: int = None):
+    """Retention by dropping whole partitions instead of deleting rows.
+
+    Late rows older than every range partition land in `<table>_default`,
+    which is never dropped; its expired rows are deleted instead.
+    """
+    retention_days = RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return []
+    cutoff = datetime.utcnow().date() - timedelta(days=retention_days)
+    with engine.connect() as connection:
+        rows = connection.execute(text(
+            "SELECT child.relname, parent.relname FROM pg_inherits i "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "WHERE parent.relname = ANY(:tables)"
+        ), {"tables": list(PARTITIONED_TABLES)}).all()
+    dropped = []
+    for child, parent in rows:
+        parsed = _parse_partition_name(child)
+        if not parsed or parsed[0] != parent:
+            continue
+        # Only drop once the partition's whole range is past the cutoff
+        _, start, period = parsed
+        if _next_period(start, period) > cutoff:
+            continue
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(f"DROP TABLE {child}"))
+            dropped.append(child)
+        except Exception as e:
+            print(f"Could not drop expired partition {child}: {e}")
+    for table in {parent for _, parent in rows}:
+        try:
+            with engine.begin() as connection:
+                deleted = connection.execute(
+                    text(f"DELETE FROM {table}_default WHERE timestamp < :cutoff"), {"cutoff": cutoff}
+                ).rowcount
+            if deleted:
+                print(f"Deleted {deleted} expired rows from {table}_default.")
+        except Exception as e:
+            print(f"Could not expire rows in {table}_default: {e}")
+    return dropped
+
+
+def run_maintenance(engine):
+    ensure_future_partitions(engine)
+    dropped = drop_expired_partitions(engine)
+    if dropped:
+        print(f"Dropped expired partitions: {', '.join(dropped)}")
+    # Compacted readings live outside the partitions; expire them on the same schedule
+    try:
+        blocks = coldstorage.drop_expired_blocks(engine, RETENTION_DAYS)
+    except Exception as e:
+        print(f"Could not drop expired reading blocks: {e}")
+    else:
+        if blocks:
+            print(f"Dropped {blocks} expired reading blocks.")
+
+
+def setup(engine):
+    """Create partitioned parents and upcoming partitions. Call before create_all."""
+    if not is_enabled(engine):
+        return
+    with engine.begin() as connection:
+        # Parents reference devices, so create the plain tables first
+        plain = [t for t in Base.metadata.sorted_tables if t.name not in PARTITIONED_TABLES]
+        Base.metadata.create_all(bind=connection, tables=plain)
+        create_partitioned_tables(connection)
+    run_maintenance(engine)
+
+
+def start_maintenance_thread(engine):
+    if not is_enabled(engine):
+        return None
+
+    def loop():
+        while True:
+            time.sleep(MAINTENANCE_INTERVAL_SECONDS)
+            try:
+                run_maintenance(engine)
+            except Exception as e:
+                # Another worker may be racing on the same DDL; retry next tick
+                print(f"Partition maintenance failed: {e}")
+
+    thread = threading.Thread(target=loop, name="partition-maintenance", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,53 @@
+"""Parsing and manifest helpers for bulk device provisioning."""
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from typing import List
+import csv
+import io
+import json
+
+from . import schemas
+
+MAX_BULK_DEVICES = 5000
+
+
+def parse_device_list(body: bytes, content_type: str) -> List[schemas.DeviceBase]:
+    """Accept a JSON list (or {"devices": [...]}) or a CSV with a device_id column."""
+    text = body.decode("utf-8-sig")
+    if "csv" in content_type:
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or "device_id" not in reader.fieldnames:
+            raise ValueError("CSV needs a 'device_id' header")
+        items = [
+            {"device_id": row["device_id"].strip(), **({"device_type": row["device_type"].strip()} if row.get("device_type") else {})}
+            for row in reader
+            if row.get("device_id", "").strip()
+        ]
+    else:
+        items = json.loads(text)
+        if isinstance(items, dict):
+            items = items.get("devices", [])
+    if not isinstance(items, list):
+        raise ValueError("Expected a list of devices")
+    return [schemas.DeviceBase(**item) for item in items]
+
+
+async def bulk_device_list(request: Request) -> List[schemas.DeviceBase]:
+    """Dependency reading the bulk request body as JSON or CSV."""
+    try:
+        devices = parse_device_list(await request.body(), request.headers.get("content-type", ""))
+    except (ValueError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid device list: {e}")
+    if not devices:
+        raise HTTPException(status_code=400, detail="No devices given")
+    if len(devices) > MAX_BULK_DEVICES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_DEVICES} devices per request")
+    return devices
+
+
+def manifest_csv(rows: List[dict]) -> str:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=["device_id", "device_type", "device_token"])
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
@@ -0,0 +1,117 @@
+"""In-memory admission control for device write endpoints.
+
+Each authenticated (device_type, device_id, Device-Token) gets a token bucket;
+requests over the limit are rejected with 429 right after the cached device
+lookup and token check, before any other database work. The device type comes
+from the stored device record. Limits are per
+worker process. Override defaults with RATE_LIMIT_<DEVICE_TYPE>="rate,burst",
+e.g. RATE_LIMIT_GAS_SENSOR="0.5,5".
+"""
+from collections import OrderedDict
+from fastapi import HTTPException
+from typing import Dict, Tuple
+import math
+import os
+import threading
+import time
+
+# Firmware sends every 2s, so 2 req/s with a burst of 10 leaves plenty of headroom
+DEFAULT_LIMIT = (2.0, 10)
+DEVICE_TYPE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "gas_sensor": DEFAULT_LIMIT,
+    "ldr_sensor": DEFAULT_LIMIT,
+}
+MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 100_000))
+# 0 disables the global cap on concurrently running write handlers
+WRITE_CONCURRENCY_LIMIT = int(os.getenv("WRITE_CONCURRENCY_LIMIT", 0))
+
+
+def _limit_from_env(device_type: str):
+    raw = os.getenv(f"RATE_LIMIT_{device_type.upper()}")
+    if not raw:
+        return None
+    rate, burst = raw.split(",")
+    return float(rate), int(burst)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Consume one token. Returns 0 if allowed, else seconds until one is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Tuple[float, int]] = None, max_buckets: int = MAX_BUCKETS):
+        self.limits = dict(DEVICE_TYPE_LIMITS if limits is None else limits)
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+        self.dropped: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def limit_for(self, device_type: str) -> Tuple[float, int]:
+        return _limit_from_env(device_type) or self.limits.get(device_type, DEFAULT_LIMIT)
+
+    def check(self, device_type: str, device_id: str, device_token: str):
+        """Raise 429 with Retry-After if this device is over its rate.
+
+        Only call this for authenticated requests: random tokens would
+        otherwise fill the LRU and evict (reset) real devices' buckets.
+        """
+        key = (device_type, device_id, device_token)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                rate, burst = self.limit_for(device_type)
+                bucket = self.buckets[key] = TokenBucket(rate, burst, now)
+                # Bound memory: forget the least recently seen clients
+                while len(self.buckets) > self.max_buckets:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+            retry_after = bucket.take(now)
+            if retry_after:
+                self.dropped[device_id] = self.dropped.get(device_id, 0) + 1
+                self.dropped.move_to_end(device_id)
+                while len(self.dropped) > self.max_buckets:
+                    self.dropped.popitem(last=False)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests from this device",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    def dropped_count(self, device_id: str) -> int:
+        return self.dropped.get(device_id, 0)
+
+
+limiter = RateLimiter()
+
+_write_slots = threading.BoundedSemaphore(WRITE_CONCURRENCY_LIMIT) if WRITE_CONCURRENCY_LIMIT > 0 else None
+
+
+def write_slot():
+    """Dependency capping how many write handlers run at once across the worker."""
+    if _write_slots is None:
+        yield
+        return
+    if not _write_slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
+    try:
+        yield
+    finally:
+        _write_slots.release()
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from .. import database, events, models, schemas, auth
+from ..automation import EQUALITY_OPERATORS, NUMERIC_METRICS, coerce_value
+
+router = APIRouter(
+    prefix="/api/v1/automation",
+    tags=["automation"]
+)
+
+@router.get("/rules", response_model=List[schemas.AutomationRuleResponse])
+def get_rules(device_id: Optional[str] = None, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    query = db.query(models.AutomationRule).join(models.Device).filter(models.Device.owner_id == current_user.id)
+    if device_id is not None:
+        query = query.filter(models.AutomationRule.device_id == device_id)
+    return query.all()
+
+@router.post("/rules", response_model=schemas.AutomationRuleResponse)
+def create_rule(rule: schemas.AutomationRuleCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    # Both the source device and the target output must belong to the user
+    device = db.query(models.Device).filter(models.Device.device_id == rule.device_id, models.Device.owner_id == current_user.id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    output = db.query(models.DeviceOutput).join(models.Device).filter(
+        models.DeviceOutput.id == rule.output_id, models.Device.owner_id == current_user.id
+    ).first()
+    if not output:
+        raise HTTPException(status_code=404, detail="Output not found")
+
+    if rule.metric not in NUMERIC_METRICS and rule.operator not in EQUALITY_OPERATORS:
+        raise HTTPException(status_code=400, detail=f"'{rule.metric}' only supports == and !=")
+    try:
+        coerce_value(rule.metric, rule.value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{rule.value}' is not a valid value for '{rule.metric}'")
+
+    new_rule = models.AutomationRule(**rule.model_dump())
+    db.add(new_rule)
+    events.publish(db, events.RULES_CHANGED, device_id=rule.device_id)
+    db.commit()
+    db.refresh(new_rule)
+    return new_rule
+
+@router.delete("/rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_rule(rule_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    rule = db.query(models.AutomationRule).join(models.Device).filter(
+        models.AutomationRule.id == rule_id, models.Device.owner_id == current_user.id
+    ).first()
+    if not rule:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    device_id = rule.device_id
+    db.delete(rule)
+    events.publish(db, events.RULES_CHANGED, device_id=device_id)
+    db.commit()
+    return None
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Header, status
 from sqlalchemy.orm import Session
-from .. import database, models, schemas
+from .. import database, dedup, models, ratelimit, schemas
+from ..automation import engine as automation
+from ..liveness import tracker
+from ..state import cache
 
 router = APIRouter(
     prefix="/api/v1",
@@ -25,30 +28,56 @@ def calculate_status(gas: Optional[float], temperature: Optional[float], distanc
 def ingest_data(
     data: schemas.SensorDataCreate, 
     device_token: str = Header(..., alias="Device-Token"), # ESP32 sends this header
+    _slot: None = Depends(ratelimit.write_slot),
     db: Session = Depends(database.get_db)
 ):
-    # Authenticate device
-    device = db.query(models.Device).filter(models.Device.device_id == data.device_id).first()
-    if not device:
+    # Device record (token, type) is cached per worker, kept fresh via events
+    device = cache.get_device(db, data.device_id)
+    if device is None:
          raise HTTPException(status_code=404, detail="Device not found")
-    
+
     # Secure header check (simple string match)
-    if device.device_token != device_token:
+    if device.token != device_token:
         raise HTTPException(status_code=401, detail="Invalid Device Token")
 
+    # Reject runaway devices before any further database work
+    ratelimit.limiter.check(device.device_type, data.device_id, device_token)
+    tracker.touch(data.device_id)
+
+    # Drop blind retries: return the row already stored for this seq/timestamp
+    device_ts = dedup.device_timestamp(data.seq, data.timestamp)
+    key = dedup.dedup_key(data.seq, device_ts)
+    if key is not None and dedup.sensor_data_window.seen(data.device_id, key):
+        existing = dedup.find_existing(db, models.SensorData, data.device_id, data.seq, device_ts)
+        if existing is not None:
+            return existing
+
     status_val = calculate_status(data.gas, data.temperature, data.distance)
 
-    new_reading = models.SensorData(
-        device_id=data.device_id,
+    new_reading, created = dedup.insert_reading(
+        db, models.SensorData, data.device_id, data.seq, device_ts,
         gas=data.gas,
         temperature=data.temperature,
         humidity=data.humidity,
         distance=data.distance,
         status=status_val
     )
-    
-    db.add(new_reading)
+    if not created:
+        return new_reading
+    reading = {
+        "id": new_reading.id,
+        "timestamp": new_reading.timestamp,
+        "gas": new_reading.gas,
+        "temperature": new_reading.temperature,
+        "humidity": new_reading.humidity,
+        "distance": new_reading.distance,
+        "status": new_reading.status,
+    }
+    # Rule actions land in this transaction, ready for the relay's next poll
+    automation.evaluate(db, data.device_id, reading)
     db.commit()
     db.refresh(new_reading)
+    if key is not None:
+        dedup.sensor_data_window.add(data.device_id, key)
     
     return new_reading
@@ -1,24 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from collections import Counter
+from datetime import datetime
+from typing import List, Literal, Optional
 import secrets
-from .. import database, models, schemas, auth
+from .. import coldstorage, database, dedup, events, models, provisioning, ratelimit, schemas, auth
+from ..liveness import tracker
+from ..serialization import SENSOR_DATA_FIELDS, rows_response
 
 router = APIRouter(
     prefix="/api/v1/devices",
     tags=["devices"]
 )
 
+def with_liveness(device: models.Device) -> dict:
+    online, last_seen = tracker.status(device.device_id, device.last_seen)
+    return {
+        "device_id": device.device_id,
+        "device_type": device.device_type,
+        "device_token": device.device_token,
+        "created_at": device.created_at,
+        "last_seen": last_seen,
+        "online": online,
+    }
+
 @router.get("/", response_model=List[schemas.DeviceResponse])
 def get_my_devices(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    return current_user.devices
+    # Online status comes from the in-memory tracker plus the persisted last_seen
+    return [with_liveness(device) for device in current_user.devices]
 
 @router.get("/{device_id}", response_model=schemas.DeviceResponse)
 def get_device(device_id: str, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     device = db.query(models.Device).filter(models.Device.device_id == device_id, models.Device.owner_id == current_user.id).first()
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
-    return device
+    return with_liveness(device)
 
 @router.post("/", response_model=schemas.DeviceResponse)
 def create_device(device: schemas.DeviceBase, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
@@ -37,21 +55,96 @@ def create_device(device: schemas.DeviceBase, current_user: models.User = Depend
         device_type=device.device_type
     )
     db.add(new_device)
+    # Never broadcast the token: anyone who can LISTEN would see it. Workers load it on a miss
+    events.publish(db, events.DEVICE_CREATED, device_id=new_device.device_id)
     db.commit()
     db.refresh(new_device)
     return new_device
 
+@router.post("/bulk", response_model=schemas.BulkDeviceResponse)
+def create_devices_bulk(
+    format: Literal["json", "csv"] = "json",
+    # Dependencies resolve in order: authenticate before reading a large body
+    current_user: models.User = Depends(auth.get_current_user),
+    devices: List[schemas.DeviceBase] = Depends(provisioning.bulk_device_list),
+    db: Session = Depends(database.get_db)
+):
+    # Body is a JSON list or a CSV (device_id[,device_type]); ?format=csv returns a CSV manifest
+    device_ids = [device.device_id for device in devices]
+    duplicates = sorted(d for d, count in Counter(device_ids).items() if count > 1)
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Duplicate device IDs in request: {', '.join(duplicates)}")
+
+    # One set-based conflict check instead of a lookup per device
+    existing = [row.device_id for row in db.query(models.Device.device_id).filter(models.Device.device_id.in_(device_ids))]
+    if existing:
+        raise HTTPException(status_code=400, detail=f"Device IDs already registered: {', '.join(sorted(existing))}")
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "device_id": device.device_id,
+            "owner_id": current_user.id,
+            "device_token": secrets.token_hex(16),
+            "device_type": device.device_type,
+            "created_at": now,
+        }
+        for device in devices
+    ]
+    try:
+        # Single executemany in one transaction. No device_created events: worker
+        # token caches load new devices from the DB on first use anyway.
+        db.execute(insert(models.Device.__table__), rows)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Device IDs already registered")
+
+    manifest = [{key: row[key] for key in ("device_id", "device_type", "device_token")} for row in rows]
+    if format == "csv":
+        return Response(
+            content=provisioning.manifest_csv(manifest),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="device-credentials.csv"'},
+        )
+    return {"created": len(manifest), "devices": manifest}
+
 @router.get("/{device_id}/readings", response_model=List[schemas.SensorDataResponse])
-def get_device_readings(device_id: str, limit: int = 20, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+def get_device_readings(device_id: str, limit: int = 20, start: Optional[datetime] = None, end: Optional[datetime] = None, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     # Verify ownership
     device = db.query(models.Device).filter(models.Device.device_id == device_id, models.Device.owner_id == current_user.id).first()
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
         
-    readings = db.query(models.SensorData).filter(models.SensorData.device_id == device_id).order_by(models.SensorData.timestamp.desc()).limit(limit).all()
+    # Project only the response columns and serialize the tuples directly,
+    # skipping ORM hydration and per-row response_model validation.
+    columns = [getattr(models.SensorData, field) for field in SENSOR_DATA_FIELDS]
+    start, end = dedup.normalize_timestamp(start), dedup.normalize_timestamp(end)
+    query = db.query(*columns).filter(models.SensorData.device_id == device_id)
+    if start is not None:
+        query = query.filter(models.SensorData.timestamp >= start)
+    if end is not None:
+        query = query.filter(models.SensorData.timestamp <= end)
+    readings = query.order_by(models.SensorData.timestamp.desc()).limit(limit).all()
+    # Older history may live in compressed blocks
+    readings = coldstorage.merge_cold(db, "sensor_data", device_id, SENSOR_DATA_FIELDS, readings, limit, start, end)
     # Return reversed to show chronological order in graphs if needed, but API usually sends latest first or user sorts. 
     # Let's return latest first (descending) as queried. Frontend can reverse.
-    return readings
+    return rows_response(SENSOR_DATA_FIELDS, readings)
+
+@router.get("/{device_id}/limits", response_model=schemas.DeviceLimitsResponse)
+def get_device_limits(device_id: str, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    device = db.query(models.Device).filter(models.Device.device_id == device_id, models.Device.owner_id == current_user.id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    rate, burst = ratelimit.limiter.limit_for(device.device_type or "gas_sensor")
+    # Counters are per worker process
+    return {
+        "device_id": device_id,
+        "rate_per_second": rate,
+        "burst": burst,
+        "dropped_requests": ratelimit.limiter.dropped_count(device_id),
+    }
 
 @router.delete("/{device_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_device(device_id: str, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
@@ -64,9 +157,19 @@ def delete_device(device_id: str, current_user: models.User = Depends(auth.get_c
     # Delete associated readings first (optional if cascade is set, but good for safety)
     db.query(models.SensorData).filter(models.SensorData.device_id == device_id).delete()
     db.query(models.LDRReading).filter(models.LDRReading.device_id == device_id).delete()
+    coldstorage.delete_device_blocks(db, device_id)
+    # Rules reading from this device or driving one of its outputs go too
+    output_ids = db.query(models.DeviceOutput.id).filter(models.DeviceOutput.device_id == device_id)
+    rules = db.query(models.AutomationRule).filter(
+        (models.AutomationRule.device_id == device_id) | models.AutomationRule.output_id.in_(output_ids)
+    )
+    for source_id in {rule.device_id for rule in rules} - {device_id}:
+        events.publish(db, events.RULES_CHANGED, device_id=source_id)
+    rules.delete(synchronize_session=False)
     db.query(models.DeviceOutput).filter(models.DeviceOutput.device_id == device_id).delete()
     
     # Delete the device
     db.delete(device)
+    events.publish(db, events.DEVICE_DELETED, device_id=device_id)
     db.commit()
     return None
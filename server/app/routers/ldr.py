@@ -1,12 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Header
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
+from .. import coldstorage, dedup, events, ratelimit
 from ..database import get_db
 from ..models import Device, LDRReading, DeviceOutput
 from ..schemas import LDRReadingCreate, LDRReadingResponse, DeviceOutputCreate, DeviceOutputResponse, DeviceOutputUpdate
 from ..auth import get_current_user
+from ..serialization import LDR_READING_FIELDS, rows_response
+from ..automation import engine as automation
+from ..liveness import tracker
+from ..state import cache, output_to_dict
 
 router = APIRouter(
     prefix="/api/v1/ldr",
@@ -20,31 +25,57 @@ def create_ldr_reading(
     device_id: str,
     reading: LDRReadingCreate,
     device_token: str = Header(..., alias="Device-Token"),
+    _slot: None = Depends(ratelimit.write_slot),
     db: Session = Depends(get_db)
 ):
     # Verify device exists
-    device = db.query(Device).filter(Device.device_id == device_id).first()
-    if not device:
+    device = cache.get_device(db, device_id)
+    if device is None:
         raise HTTPException(status_code=404, detail="Device not found")
-    
+
     # Verify Token
-    if device.device_token != device_token:
+    if device.token != device_token:
         raise HTTPException(status_code=401, detail="Invalid Device Token")
 
-    db_reading = LDRReading(
-        device_id=device_id,
+    # Reject runaway devices before any further database work
+    ratelimit.limiter.check(device.device_type, device_id, device_token)
+    tracker.touch(device_id)
+
+    # Drop blind retries: return the row already stored for this seq/timestamp
+    device_ts = dedup.device_timestamp(reading.seq, reading.timestamp)
+    key = dedup.dedup_key(reading.seq, device_ts)
+    if key is not None and dedup.ldr_window.seen(device_id, key):
+        existing = dedup.find_existing(db, LDRReading, device_id, reading.seq, device_ts)
+        if existing is not None:
+            return existing
+
+    db_reading, created = dedup.insert_reading(
+        db, LDRReading, device_id, reading.seq, device_ts,
         digital_value=reading.digital_value,
         analog_value=reading.analog_value
     )
-    db.add(db_reading)
+    if not created:
+        return db_reading
+    reading_values = {
+        "id": db_reading.id,
+        "timestamp": db_reading.timestamp,
+        "digital_value": db_reading.digital_value,
+        "analog_value": db_reading.analog_value,
+    }
+    # Rule actions land in this transaction, ready for the relay's next poll
+    automation.evaluate(db, device_id, reading_values)
     db.commit()
     db.refresh(db_reading)
+    if key is not None:
+        dedup.ldr_window.add(device_id, key)
     return db_reading
 
 @router.get("/{device_id}/readings", response_model=List[LDRReadingResponse])
 def get_ldr_readings(
     device_id: str,
     limit: int = 50,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
@@ -53,8 +84,17 @@ def get_ldr_readings(
     if not device:
         raise HTTPException(status_code=404, detail="Device not found or access denied")
 
-    readings = db.query(LDRReading).filter(LDRReading.device_id == device_id).order_by(LDRReading.timestamp.desc()).limit(limit).all()
-    return readings
+    columns = [getattr(LDRReading, field) for field in LDR_READING_FIELDS]
+    start, end = dedup.normalize_timestamp(start), dedup.normalize_timestamp(end)
+    query = db.query(*columns).filter(LDRReading.device_id == device_id)
+    if start is not None:
+        query = query.filter(LDRReading.timestamp >= start)
+    if end is not None:
+        query = query.filter(LDRReading.timestamp <= end)
+    readings = query.order_by(LDRReading.timestamp.desc()).limit(limit).all()
+    # Older history may live in compressed blocks
+    readings = coldstorage.merge_cold(db, "ldr_readings", device_id, LDR_READING_FIELDS, readings, limit, start, end)
+    return rows_response(LDR_READING_FIELDS, readings)
 
 # --- DEVICE OUTPUTS ---
 
@@ -77,6 +117,8 @@ def create_output(
         is_active=output.is_active
     )
     db.add(db_output)
+    db.flush()
+    events.publish(db, events.OUTPUT_CHANGED, device_id=device_id, output=output_to_dict(db_output))
     db.commit()
     db.refresh(db_output)
     return db_output
@@ -84,12 +126,16 @@ def create_output(
 @router.get("/{device_id}/outputs", response_model=List[DeviceOutputResponse])
 def get_outputs(
     device_id: str,
+    device_token: Optional[str] = Header(None, alias="Device-Token"),
     db: Session = Depends(get_db)
     # Note: ESP32 needs to access this without user auth token, usually via device token
     # For now ensuring it's open or checking device_token in headers if implemented
 ):
-    outputs = db.query(DeviceOutput).filter(DeviceOutput.device_id == device_id).all()
-    return outputs
+    # Firmware polls this endpoint with its token, so an authenticated poll doubles as a heartbeat
+    if device_token is not None and cache.get_device_token(db, device_id) == device_token:
+        tracker.touch(device_id)
+    # Served from the per-worker cache; toggles on any worker update it via events
+    return cache.get_outputs(db, device_id)
 
 @router.put("/outputs/{output_id}", response_model=DeviceOutputResponse)
 def update_output_state(
@@ -110,6 +156,7 @@ def update_output_state(
 
     output.is_active = state.is_active
     output.last_updated = datetime.utcnow()
+    events.publish(db, events.OUTPUT_CHANGED, device_id=output.device_id, output=output_to_dict(output))
     db.commit()
     db.refresh(output)
     return output
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from datetime import datetime
 
 # User Schemas
@@ -36,9 +36,21 @@ class DeviceCreate(DeviceBase):
 class DeviceResponse(DeviceBase):
     device_token: str
     created_at: datetime
+    last_seen: Optional[datetime] = None
+    online: bool = False
     class Config:
         from_attributes = True
 
+class BulkDeviceResponse(BaseModel):
+    created: int
+    devices: List[DeviceCreate]
+
+class DeviceLimitsResponse(BaseModel):
+    device_id: str
+    rate_per_second: float
+    burst: int
+    dropped_requests: int
+
 # Sensor Data Schemas
 class SensorDataCreate(BaseModel):
     device_id: str
@@ -46,6 +58,9 @@ class SensorDataCreate(BaseModel):
     temperature: Optional[float] = None
     humidity: Optional[float] = None
     distance: Optional[float] = None
+    # Optional retry/ordering metadata from the device
+    seq: Optional[int] = None
+    timestamp: Optional[datetime] = None
 
 class SensorDataResponse(SensorDataCreate):
     id: int
@@ -67,6 +82,8 @@ class LDRReadingCreate(BaseModel):
     device_id: str
     digital_value: bool
     analog_value: int
+    seq: Optional[int] = None
+    timestamp: Optional[datetime] = None
 
 class LDRReadingResponse(LDRReadingCreate):
     id: int
@@ -89,3 +106,20 @@ class DeviceOutputResponse(DeviceOutputCreate):
     last_updated: datetime
     class Config:
         from_attributes = True
+
+# Automation Schemas
+class AutomationRuleCreate(BaseModel):
+    device_id: str
+    metric: Literal["gas", "temperature", "humidity", "distance", "status", "digital_value", "analog_value"]
+    operator: Literal["<", "<=", ">", ">=", "==", "!="]
+    value: str
+    hold_seconds: int = Field(0, ge=0)
+    output_id: int
+    action_active: bool = True
+    enabled: bool = True
+
+class AutomationRuleResponse(AutomationRuleCreate):
+    id: int
+    created_at: datetime
+    class Config:
+        from_attributes = True
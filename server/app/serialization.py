@@ -0,0 +1,37 @@
+from datetime import datetime
+from typing import Iterable, Sequence
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # Fall back to stdlib json if orjson isn't installed
+    orjson = None
+    import json
+
+# Column projections for the read-heavy endpoints. Order matches the field
+# order of the corresponding response schemas so the wire format is unchanged.
+SENSOR_DATA_FIELDS = ("device_id", "gas", "temperature", "humidity", "distance", "seq", "timestamp", "id", "status")
+LDR_READING_FIELDS = ("device_id", "digital_value", "analog_value", "seq", "timestamp", "id")
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def rows_response(fields: Sequence[str], rows: Iterable[tuple]) -> Response:
+    """Serialize projected row tuples straight to a JSON array response.
+
+    Skips ORM hydration and per-row Pydantic validation; callers are expected
+    to select exactly `fields` in that order.
+    """
+    content = [dict(zip(fields, row)) for row in rows]
+    return Response(content=dumps(content), media_type="application/json")
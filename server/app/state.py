@@ -0,0 +1,118 @@
+"""Per-worker cache of device state, kept coherent through app.events.
+
+Lookups fall back to the database on a miss; change events from any worker
+update or evict entries so firmware polls never see stale output state.
+Unknown device ids are remembered for MISSING_DEVICE_TTL_SECONDS so a
+misconfigured device can't turn every request into a query.
+"""
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+from typing import Dict, List, NamedTuple, Optional
+import os
+import threading
+import time
+
+from . import events, models
+
+MISSING_DEVICE_TTL_SECONDS = float(os.getenv("MISSING_DEVICE_TTL_SECONDS", 10))
+MAX_MISSING_DEVICES = int(os.getenv("MAX_MISSING_DEVICES", 10_000))
+
+
+class DeviceRecord(NamedTuple):
+    token: str
+    device_type: str
+
+
+class DeviceStateCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.devices: Dict[str, DeviceRecord] = {}
+        # device id -> monotonic time until which it's known not to exist
+        self.missing: "OrderedDict[str, float]" = OrderedDict()
+        self.outputs: Dict[str, Dict[int, dict]] = {}
+        # Bumped on every output event so loads racing with a change are discarded
+        self._versions: Dict[str, int] = {}
+        self._epoch = 0
+
+    # --- lookups ---
+
+    def get_device(self, db: Session, device_id: str) -> Optional[DeviceRecord]:
+        """Token and type for `device_id`, or None if the device doesn't exist."""
+        record = self.devices.get(device_id)
+        if record is not None:
+            return record
+        now = time.monotonic()
+        if self.missing.get(device_id, 0) > now:
+            return None
+        device = db.query(models.Device.device_token, models.Device.device_type).filter(models.Device.device_id == device_id).first()
+        if device is None:
+            with self._lock:
+                self.missing[device_id] = now + MISSING_DEVICE_TTL_SECONDS
+                self.missing.move_to_end(device_id)
+                while len(self.missing) > MAX_MISSING_DEVICES:
+                    self.missing.popitem(last=False)
+            return None
+        record = DeviceRecord(device.device_token, device.device_type or "gas_sensor")
+        with self._lock:
+            self.devices[device_id] = record
+        return record
+
+    def get_device_token(self, db: Session, device_id: str) -> Optional[str]:
+        record = self.get_device(db, device_id)
+        return record.token if record is not None else None
+
+    def get_outputs(self, db: Session, device_id: str) -> List[dict]:
+        outputs = self.outputs.get(device_id)
+        if outputs is None:
+            # The outputs poll is unauthenticated; only cache devices that exist
+            if self.get_device(db, device_id) is None:
+                return []
+            version = (self._epoch, self._versions.get(device_id, 0))
+            rows = db.query(models.DeviceOutput).filter(models.DeviceOutput.device_id == device_id).all()
+            outputs = {row.id: output_to_dict(row) for row in rows}
+            with self._lock:
+                # A change committed while we were querying may be missing from
+                # `rows`; serve them this once but let the next poll reload
+                if version == (self._epoch, self._versions.get(device_id, 0)):
+                    self.outputs[device_id] = outputs
+        return [outputs[key] for key in sorted(outputs)]
+
+    # --- event handling ---
+
+    def handle_event(self, message: dict):
+        kind = message.get("event")
+        device_id = message.get("device_id")
+        with self._lock:
+            if kind == events.RESYNC:
+                self._epoch += 1
+                self.devices.clear()
+                self.missing.clear()
+                self.outputs.clear()
+            elif kind == events.DEVICE_CREATED:
+                # The token isn't broadcast; the next lookup loads it from the database
+                self.devices.pop(device_id, None)
+                self.missing.pop(device_id, None)
+            elif kind == events.DEVICE_DELETED:
+                self._versions.pop(device_id, None)
+                self.devices.pop(device_id, None)
+                self.outputs.pop(device_id, None)
+            elif kind == events.OUTPUT_CHANGED:
+                self._versions[device_id] = self._versions.get(device_id, 0) + 1
+                outputs = self.outputs.get(device_id)
+                if outputs is not None:
+                    outputs[message["output"]["id"]] = message["output"]
+
+
+def output_to_dict(output: models.DeviceOutput) -> dict:
+    return {
+        "id": output.id,
+        "device_id": output.device_id,
+        "output_name": output.output_name,
+        "gpio_pin": output.gpio_pin,
+        "is_active": output.is_active,
+        "last_updated": output.last_updated,
+    }
+
+
+cache = DeviceStateCache()
+events.subscribe(cache.handle_event)
@@ -0,0 +1,58 @@
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from app import codec
+from app.coldstorage import SCHEMAS
+
+HOURS = 24
+REPEAT = 5
+DEVICE_ID = "ESP32_01"
+
+def synthetic_hour(start, first_id):
+    # One reading every ~2s with slowly drifting values, like the gas firmware sends
+    rows = []
+    ts = start
+    for i in range(1800):
+        ts += timedelta(seconds=2, microseconds=random.randint(-3000, 3000))
+        rows.append((
+            first_id + i,
+            ts,
+            first_id + i,
+            round(400 + 80 * math.sin(i / 200) + random.gauss(0, 2), 1),
+            round(28 + math.sin(i / 900), 1),
+            round(55 + 5 * math.cos(i / 700), 1),
+            round(random.uniform(80, 82), 1),
+            "SAFE" if i % 300 else "WARNING",
+        ))
+    return rows
+
+def heap_row_bytes(row):
+    # Approximate Postgres heap tuple: 24B header + 4B line pointer,
+    # int4 id, varchar device_id, timestamp, int8 seq, 4 float8, varchar status
+    return 24 + 4 + 4 + (1 + len(DEVICE_ID)) + 8 + 8 + 4 * 8 + (1 + len(row[7]))
+
+def run():
+    _, schema = SCHEMAS["sensor_data"]
+    hours = [synthetic_hour(datetime(2026, 1, 1) + timedelta(hours=h), h * 1800) for h in range(HOURS)]
+    columns = [{name: [row[i] for row in rows] for i, (name, _) in enumerate(schema)} for rows in hours]
+
+    start = time.perf_counter()
+    blobs = [codec.encode_block(schema, cols) for cols in columns]
+    encode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        for blob in blobs:
+            codec.decode_block(schema, blob)
+    decode_s = (time.perf_counter() - start) / REPEAT
+
+    rows = sum(len(h) for h in hours)
+    heap = sum(heap_row_bytes(row) for h in hours for row in h)
+    packed = sum(len(blob) for blob in blobs)
+    print(f"{rows} rows in {len(blobs)} hourly blocks")
+    print(f"Heap estimate: {heap / rows:.1f} B/row   Block: {packed / rows:.2f} B/row   Ratio: {heap / packed:.1f}x")
+    print(f"Encode: {rows / encode_s:,.0f} rows/s   Decode: {rows / decode_s:,.0f} rows/s")
+
+if __name__ == "__main__":
+    run()
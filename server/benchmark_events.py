@@ -0,0 +1,49 @@
+import threading
+import time
+from app.database import SessionLocal, engine
+from app import events
+
+SAMPLES = 200
+TIMEOUT = 5.0
+
+def run():
+    """Measure commit-to-delivery latency of change events on DATABASE_URL.
+
+    On Postgres this goes through LISTEN/NOTIFY; on SQLite it measures the
+    in-process fallback.
+    """
+    listener = events.start(engine)
+    if listener is not None and not listener.ready.wait(TIMEOUT):
+        print("Event listener did not connect.")
+        return
+
+    latencies = []
+    received = threading.Event()
+
+    def on_event(message):
+        if message.get("event") == "benchmark":
+            latencies.append(time.time() - message["sent_at"])
+            received.set()
+
+    events.subscribe(on_event)
+    db = SessionLocal()
+    try:
+        for i in range(SAMPLES):
+            received.clear()
+            events.publish(db, "benchmark", seq=i)
+            db.commit()
+            if not received.wait(TIMEOUT):
+                print(f"Event {i} was not delivered within {TIMEOUT}s")
+                return
+    finally:
+        db.close()
+        events.unsubscribe(on_event)
+        events.stop()
+
+    latencies.sort()
+    ms = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"Backend: {engine.dialect.name} ({SAMPLES} events)")
+    print(f"p50 {ms(0.50):.2f} ms  p95 {ms(0.95):.2f} ms  p99 {ms(0.99):.2f} ms  max {latencies[-1] * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,76 @@
+import os
+import time
+import random
+from datetime import datetime, timedelta
+
+# Benchmark against a throwaway in-memory SQLite database
+os.environ["DATABASE_URL"] = "sqlite://"
+
+import json
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app import models, schemas
+from app.serialization import SENSOR_DATA_FIELDS, rows_response
+
+DEVICE_ID = "BENCH_01"
+LIMITS = (20, 500, 5000)
+REPEAT = 20
+
+def seed(db, count):
+    db.add(models.Device(device_id=DEVICE_ID, device_token="bench", device_type="gas_sensor"))
+    start = datetime.utcnow() - timedelta(seconds=2 * count)
+    db.bulk_save_objects([
+        models.SensorData(
+            device_id=DEVICE_ID,
+            timestamp=start + timedelta(seconds=2 * i),
+            gas=random.uniform(200, 1200),
+            temperature=random.uniform(20, 45),
+            humidity=random.uniform(30, 80),
+            distance=random.uniform(10, 100),
+            status="SAFE",
+        )
+        for i in range(count)
+    ])
+    db.commit()
+
+def orm_path(db, limit):
+    # What FastAPI does with response_model + from_attributes
+    readings = db.query(models.SensorData).filter(models.SensorData.device_id == DEVICE_ID).order_by(models.SensorData.timestamp.desc()).limit(limit).all()
+    validated = [schemas.SensorDataResponse.model_validate(r) for r in readings]
+    return JSONResponse(jsonable_encoder(validated)).body
+
+def projection_path(db, limit):
+    columns = [getattr(models.SensorData, field) for field in SENSOR_DATA_FIELDS]
+    readings = db.query(*columns).filter(models.SensorData.device_id == DEVICE_ID).order_by(models.SensorData.timestamp.desc()).limit(limit).all()
+    return rows_response(SENSOR_DATA_FIELDS, readings).body
+
+def measure(fn, db, limit):
+    fn(db, limit)  # warm up
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn(db, limit)
+    elapsed = time.perf_counter() - start
+    return (limit * REPEAT) / elapsed
+
+def run():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, max(LIMITS))
+
+    # Both paths must produce the same payload
+    assert json.loads(orm_path(db, 20)) == json.loads(projection_path(db, 20))
+
+    print(f"{'limit':>6} {'orm rows/s':>14} {'projection rows/s':>18} {'speedup':>8}")
+    for limit in LIMITS:
+        orm_rate = measure(orm_path, db, limit)
+        fast_rate = measure(projection_path, db, limit)
+        print(f"{limit:>6} {orm_rate:>14,.0f} {fast_rate:>18,.0f} {fast_rate / orm_rate:>7.1f}x")
+    db.close()
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,21 @@
+from app.database import SessionLocal
+from app import coldstorage
+
+def compact():
+    print(f"Compacting readings older than {coldstorage.COLD_STORAGE_AFTER_DAYS:g} days "
+          f"(before {coldstorage.compaction_cutoff()})...")
+    db = SessionLocal()
+    try:
+        for kind in coldstorage.SCHEMAS:
+            blocks, rows = coldstorage.compact(db, kind)
+            print(f"{kind}: packed {rows} rows into {blocks} blocks.")
+    except Exception as e:
+        db.rollback()
+        print(f"Compaction failed: {e}")
+        raise
+    finally:
+        db.close()
+    print("Compaction complete.")
+
+if __name__ == "__main__":
+    compact()
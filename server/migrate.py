@@ -1,5 +1,6 @@
 from sqlalchemy import create_engine, text
 from app.database import SQLALCHEMY_DATABASE_URL
+from app import partitioning
 
 def migrate():
     print(f"Connecting to database...")
@@ -25,6 +26,37 @@ def migrate():
             print("Successfully added 'device_type'.")
         except Exception as e:
             print(f"Error adding 'device_type': {e}")
+
+        print("Adding 'last_seen' column to devices table...")
+        try:
+            connection.execute(text("ALTER TABLE devices ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP"))
+            print("Successfully added 'last_seen'.")
+        except Exception as e:
+            print(f"Error adding 'last_seen': {e}")
+
+        for table in ("sensor_data", "ldr_readings"):
+            print(f"Adding 'seq' column and dedup constraint to {table} table...")
+            try:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS seq BIGINT"))
+                # Partitioned tables only get the timestamp backstop (it includes the partition key)
+                if not partitioning.is_partitioned(connection, table):
+                    connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_device_seq ON {table} (device_id, seq)"))
+                print(f"Successfully added 'seq' to {table}.")
+            except Exception as e:
+                print(f"Error adding 'seq' to {table}: {e}")
+
+            print(f"Adding device timestamp dedup constraint to {table} table...")
+            try:
+                duplicates = connection.execute(text(
+                    f"SELECT count(*) FROM (SELECT 1 FROM {table} GROUP BY device_id, timestamp HAVING count(*) > 1) d"
+                )).scalar()
+                if duplicates:
+                    print(f"Skipped: {duplicates} (device_id, timestamp) pairs in {table} are duplicated. Remove them and re-run.")
+                else:
+                    connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_device_ts ON {table} (device_id, timestamp)"))
+                    print(f"Successfully added timestamp constraint to {table}.")
+            except Exception as e:
+                print(f"Error adding timestamp constraint to {table}: {e}")
             
         connection.commit()
     print("Migration complete.")
@@ -0,0 +1,70 @@
+from sqlalchemy import create_engine, text
+from app.database import SQLALCHEMY_DATABASE_URL
+from app import partitioning
+
+def migrate():
+    print(f"Connecting to database...")
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    if not partitioning.is_enabled(engine):
+        print("Set READINGS_PARTITION_INTERVAL=daily|monthly on a Postgres database to partition readings.")
+        return
+
+    interval = partitioning.PARTITION_INTERVAL
+    with engine.begin() as connection:
+        for table in partitioning.PARTITIONED_TABLES:
+            if partitioning.is_partitioned(connection, table):
+                print(f"'{table}' is already partitioned, skipping.")
+                continue
+
+            # The partition key is NOT NULL; refuse rather than silently lose rows
+            missing = connection.execute(text(f"SELECT count(*) FROM {table} WHERE timestamp IS NULL")).scalar()
+            if missing:
+                raise RuntimeError(
+                    f"'{table}' has {missing} rows without a timestamp. "
+                    f"Backfill or delete them before converting; nothing was changed."
+                )
+            # The new parent enforces the (device_id, timestamp) dedup backstop
+            duplicates = connection.execute(text(
+                f"SELECT count(*) FROM (SELECT 1 FROM {table} GROUP BY device_id, timestamp HAVING count(*) > 1) d"
+            )).scalar()
+            if duplicates:
+                raise RuntimeError(
+                    f"'{table}' has {duplicates} duplicated (device_id, timestamp) pairs. "
+                    f"Remove the extra rows before converting; nothing was changed."
+                )
+
+            legacy = f"{table}_legacy"
+            print(f"Converting '{table}' to {interval} partitions...")
+            connection.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+            connection.execute(text(f"ALTER INDEX IF EXISTS ix_{table}_id RENAME TO ix_{legacy}_id"))
+            connection.execute(text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey"))
+            # Dedup backstops (constraints or migrate.py indexes) would clash with the new parent's
+            for suffix in ("device_seq", "device_ts"):
+                connection.execute(text(f"ALTER INDEX IF EXISTS uq_{table}_{suffix} RENAME TO uq_{legacy}_{suffix}"))
+            # Detach the old serial sequence so the new parent can claim the name
+            connection.execute(text(f"ALTER SEQUENCE IF EXISTS {table}_id_seq RENAME TO {legacy}_id_seq"))
+
+            partitioning.create_partitioned_tables(connection)
+
+            bounds = connection.execute(text(f"SELECT min(timestamp), max(timestamp) FROM {legacy}")).first()
+            if bounds[0] is not None:
+                partitioning.create_partitions(connection, table, bounds[0].date(), bounds[1].date(), interval)
+
+            columns = [row[0] for row in connection.execute(text(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = :t ORDER BY ordinal_position"
+            ), {"t": legacy})]
+            column_list = ", ".join(columns)
+            moved = connection.execute(text(
+                f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {legacy}"
+            )).rowcount
+            connection.execute(text(
+                f"SELECT setval('{table}_id_seq', COALESCE((SELECT max(id) FROM {table}), 0) + 1, false)"
+            ))
+            connection.execute(text(f"DROP TABLE {legacy}"))
+            print(f"Moved {moved} rows into partitioned '{table}'.")
+
+    partitioning.run_maintenance(engine)
+    print("Migration complete.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,47 @@
+import argparse
+import getpass
+import os
+import sys
+import requests
+
+def provision(args):
+    base_url = args.api.rstrip("/")
+
+    print(f"Logging in to {base_url} as {args.email}...")
+    password = args.password or os.getenv("SENSEGRID_PASSWORD") or getpass.getpass("Password: ")
+    resp = requests.post(f"{base_url}/auth/login", data={"username": args.email, "password": password})
+    if resp.status_code != 200:
+        print(f"Login failed: {resp.status_code} {resp.text}")
+        sys.exit(1)
+    token = resp.json()["access_token"]
+
+    # The server parses the file itself, so CSV and JSON are sent as-is
+    content_type = "text/csv" if args.file.lower().endswith(".csv") else "application/json"
+    with open(args.file, "rb") as f:
+        body = f.read()
+
+    out_format = "csv" if args.out.lower().endswith(".csv") else "json"
+    print(f"Provisioning devices from {args.file}...")
+    resp = requests.post(
+        f"{base_url}/api/v1/devices/bulk",
+        params={"format": out_format},
+        data=body,
+        headers={"Authorization": f"Bearer {token}", "Content-Type": content_type},
+    )
+    if resp.status_code != 200:
+        print(f"Provisioning failed: {resp.status_code} {resp.text}")
+        sys.exit(1)
+
+    with open(args.out, "w", newline="") as f:
+        f.write(resp.text)
+    print(f"SUCCESS! Credentials manifest written to {args.out}")
+    print("Keep this file private: it contains every device token.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Register many devices in one request.")
+    parser.add_argument("file", help="CSV (device_id,device_type) or JSON list of devices")
+    parser.add_argument("--api", default=os.getenv("SENSEGRID_API", "http://localhost:8000"))
+    parser.add_argument("--email", required=True, help="Account that will own the devices")
+    parser.add_argument("--password", help="Defaults to $SENSEGRID_PASSWORD or a prompt")
+    parser.add_argument("--out", default="device-credentials.csv", help="Manifest path (.csv or .json)")
+    provision(parser.parse_args())